@@ -24,6 +24,7 @@ admin.site.register(User, UserAdmin)
 admin.site.register(Booking)
 admin.site.register(Service)
 admin.site.register(Review)
+admin.site.register(ProviderDigest)
 
 
 admin.site.site_header = 'Justbookit admin pannel'
@@ -0,0 +1,18 @@
+from django.core.cache.backends.filebased import FileBasedCache
+
+from .metrics import CACHE_REQUESTS
+
+
+_missing = object()
+
+
+class InstrumentedFileBasedCache(FileBasedCache):
+    """FileBasedCache that counts hits and misses for the /metrics endpoint."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            CACHE_REQUESTS.labels('miss').inc()
+            return default
+        CACHE_REQUESTS.labels('hit').inc()
+        return value
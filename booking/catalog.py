@@ -0,0 +1,67 @@
+"""
+HTTP caching for the public catalog pages (home and search).
+
+The catalog's version (latest Service/Review updated_at plus the number of
+services, so deletions show up too) is computed from the database and cached
+for CATALOG_VERSION_TTL seconds, so validating a request usually costs one
+cache lookup. The cache is per host; the Service/Review signals drop the
+local copy, and other hosts pick up the change when theirs expires. Anonymous
+visitors get public, cacheable
+responses with ETag/Last-Modified and 304 handling; logged-in users see
+their own navbar and are always served private, uncached pages.
+"""
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+VERSION_CACHE_KEY = 'booking:catalog_version'
+
+
+def touch_catalog():
+    cache.delete(VERSION_CACHE_KEY)
+
+
+def catalog_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        from .models import Service, Review
+
+        services = Service.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+        latest = [services['latest'], Review.objects.aggregate(latest=Max('updated_at'))['latest']]
+        latest = [value for value in latest if value is not None]
+        version = (max(latest).timestamp() if latest else 0, services['count'])
+        cache.set(VERSION_CACHE_KEY, version, settings.CATALOG_VERSION_TTL)
+    return version
+
+
+def _etag(request, *args, **kwargs):
+    timestamp, count = catalog_version()
+    return f'catalog-{timestamp}-{count}'
+
+
+def _last_modified(request, *args, **kwargs):
+    timestamp, _ = catalog_version()
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def catalog_page(view_func):
+    conditional_view = condition(etag_func=_etag, last_modified_func=_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            response = view_func(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    return wrapper
@@ -1,3 +1,4 @@
+import uuid
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import User, Service, Booking, Review
@@ -13,6 +14,11 @@ class ServiceForm(forms.ModelForm):
         fields = ('name', 'description', 'price')
 
 class BookingForm(forms.ModelForm):
+    # A fresh key per rendered form; resubmitting the same form reuses it.
+    idempotency_key = forms.CharField(
+        max_length=64, required=False, widget=forms.HiddenInput, initial=lambda: uuid.uuid4().hex,
+    )
+
     class Meta:
         model = Booking
         fields = ('date',)
@@ -0,0 +1,102 @@
+"""
+Per-process load shedding.
+
+Every request is assigned a route class from settings.LOAD_SHEDDING (by URL
+name and method; anything unmatched is "read"). Each class has its own
+concurrency limit and a short bounded queue, so slow writes can only tie up
+their own slots. When the queue is full, or a queued request waits longer
+than the class timeout, the request gets an immediate 503 with Retry-After.
+"""
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .metrics import LOAD_SHEDDING_IN_FLIGHT, LOAD_SHEDDING_QUEUE_DEPTH, LOAD_SHEDDING_SHED
+from .middleware import resolve_view_name
+
+
+DEFAULT_ROUTE_CLASS = 'read'
+
+
+class RouteLimiter:
+
+    def __init__(self, name, concurrency, queue, timeout, retry_after=1):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot. Returns None on success, or the reason the request was shed."""
+        with self.condition:
+            if self.active < self.concurrency:
+                self.active += 1
+                LOAD_SHEDDING_IN_FLIGHT.labels(self.name).inc()
+                return None
+            if self.waiting >= self.queue:
+                return 'queue_full'
+            self.waiting += 1
+            LOAD_SHEDDING_QUEUE_DEPTH.labels(self.name).inc()
+            try:
+                acquired = self.condition.wait_for(lambda: self.active < self.concurrency, self.timeout)
+            finally:
+                self.waiting -= 1
+                LOAD_SHEDDING_QUEUE_DEPTH.labels(self.name).dec()
+            if not acquired:
+                return 'timeout'
+            self.active += 1
+            LOAD_SHEDDING_IN_FLIGHT.labels(self.name).inc()
+            return None
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            LOAD_SHEDDING_IN_FLIGHT.labels(self.name).dec()
+            self.condition.notify()
+
+
+class LoadSheddingMiddleware:
+    """Shed excess requests per route class with a fast 503 and Retry-After."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiters = {
+            name: RouteLimiter(
+                name, config['concurrency'], config['queue'], config['timeout'], config.get('retry_after', 1),
+            )
+            for name, config in settings.LOAD_SHEDDING.items()
+        }
+        self.routes = {}
+        for name, config in settings.LOAD_SHEDDING.items():
+            for view_name in config.get('views', []):
+                for method in config.get('methods', ['GET', 'HEAD', 'POST']):
+                    self.routes[view_name, method] = name
+        self.exempt = set(settings.LOAD_SHEDDING_EXEMPT_VIEWS)
+
+    def route_class(self, request):
+        view_name = resolve_view_name(request)
+        if view_name is None:
+            return DEFAULT_ROUTE_CLASS
+        if view_name in self.exempt:
+            return None
+        return self.routes.get((view_name, request.method), DEFAULT_ROUTE_CLASS)
+
+    def __call__(self, request):
+        limiter = self.limiters.get(self.route_class(request))
+        if limiter is None:
+            return self.get_response(request)
+        reason = limiter.acquire()
+        if reason:
+            LOAD_SHEDDING_SHED.labels(limiter.name, reason).inc()
+            response = HttpResponse("The service is busy, please try again shortly.", status=503, content_type='text/plain')
+            response['Retry-After'] = str(limiter.retry_after)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release()
@@ -0,0 +1,80 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare connection setup overhead with and without a psycopg connection pool "
+        "by firing bursts of short 'requests' (connect, SELECT 1, release) from many threads. "
+        "Requires the default database to be PostgreSQL, e.g. a local instance via DATABASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32, help="Concurrent threads per burst.")
+        parser.add_argument('--requests', type=int, default=20, help="Requests per thread.")
+        parser.add_argument('--pool-size', type=int, default=8, help="max_size of the pool under test.")
+
+    def handle(self, *args, **options):
+        default = connections.settings['default']
+        if default['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError("bench_db_pool needs a PostgreSQL default database.")
+
+        base = {**default, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+        base['OPTIONS'] = {key: value for key, value in default.get('OPTIONS', {}).items() if key != 'pool'}
+        connections.settings['bench_direct'] = base
+        connections.settings['bench_pool'] = {
+            **base,
+            'OPTIONS': {**base['OPTIONS'], 'pool': {'min_size': options['pool_size'], 'max_size': options['pool_size']}},
+        }
+
+        self.stdout.write(
+            f"{options['threads']} threads x {options['requests']} requests, pool max_size={options['pool_size']}"
+        )
+        self.stdout.write(f"{'mode':<8} {'total s':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        try:
+            for alias, label in (('bench_direct', 'direct'), ('bench_pool', 'pool')):
+                self.report(label, *self.burst(alias, options['threads'], options['requests']))
+        finally:
+            connections['bench_pool'].close_pool()
+
+    def burst(self, alias, threads, requests):
+        timings = []
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def worker():
+            local = []
+            start.wait()
+            for _ in range(requests):
+                began = time.perf_counter()
+                connection = connections[alias]
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                # Mirrors the end of a request: closes the socket, or hands the
+                # connection back when pooled.
+                connection.close()
+                local.append(time.perf_counter() - began)
+            connections.close_all()
+            with lock:
+                timings.extend(local)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        began = time.perf_counter()
+        start.wait()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - began, timings
+
+    def report(self, label, elapsed, timings):
+        timings = sorted(timings)
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"{label:<8} {elapsed:>8.2f} {len(timings) / elapsed:>8.0f} "
+            f"{statistics.median(timings) * 1000:>8.2f} {quantiles[94] * 1000:>8.2f} {quantiles[98] * 1000:>8.2f}"
+        )
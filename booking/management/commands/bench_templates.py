@@ -0,0 +1,108 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template import engines
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from booking.models import User, Service, Booking, Review
+from booking.templatecache import booking_template_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure template compile time and per-template render time with realistic, in-memory "
+        "contexts. Database access is blocked while rendering, so only template cost is measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Renders per template.")
+        parser.add_argument('--services', type=int, default=500, help="Services on the home and search pages.")
+        parser.add_argument('--bookings', type=int, default=1000, help="Bookings on the dashboard.")
+        parser.add_argument('--reviews', type=int, default=20, help="Reviews on the service page.")
+
+    def handle(self, *args, **options):
+        self.report_compile_times()
+
+        provider = User(pk=1, username='provider', is_professional=True)
+        customer = User(pk=2, username='customer')
+        services = [self.make_service(i, provider) for i in range(1, options['services'] + 1)]
+        bookings = [self.make_booking(i, services[i % len(services)], customer) for i in range(1, options['bookings'] + 1)]
+        reviews = [
+            Review(pk=i, booking=bookings[i % len(bookings)], rating=i % 5 + 1, comment="Great service, would book again. " * 5,
+                   created_at=timezone.now())
+            for i in range(1, options['reviews'] + 1)
+        ]
+        service = services[0]
+
+        cases = [
+            ('home', 'booking/home.html', customer,
+             {'services': services, 'title': 'Home'}, len(services)),
+            ('search_results', 'booking/search_results.html', customer,
+             {'services': services, 'query': 'clean', 'title': 'Search results'}, len(services)),
+            ('dashboard (customer)', 'booking/dashboard.html', customer,
+             {'services': None, 'bookings': bookings, 'title': 'Dashboard'}, len(bookings)),
+            ('dashboard (provider)', 'booking/dashboard.html', provider,
+             {'services': services, 'bookings': bookings, 'title': 'Dashboard'}, len(bookings)),
+            ('service_detail', 'booking/service_detail.html', customer, {
+                'service': service, 'reviews': reviews, 'next_cursor': 'x',
+                'histogram': service.rating_histogram(), 'title': service.name,
+            }, len(reviews)),
+        ]
+
+        self.stdout.write(f"\n{'template':<22} {'size':>6} {'KB':>8} {'min ms':>8} {'median ms':>10} {'mean ms':>8}")
+        for label, name, user, context, size in cases:
+            self.report_render(label, name, user, context, size, options)
+
+    def report_compile_times(self):
+        engine = engines['django'].engine
+        self.stdout.write(f"{'compile':<40} {'ms':>8}")
+        for name in booking_template_names():
+            for loader in engine.template_loaders:
+                if hasattr(loader, 'reset'):
+                    loader.reset()
+            started = time.perf_counter()
+            get_template(name)
+            self.stdout.write(f"{name:<40} {(time.perf_counter() - started) * 1000:>8.2f}")
+
+    def report_render(self, label, name, user, context, size, options):
+        template = get_template(name)
+        request = RequestFactory().get('/')
+        request.user = user
+
+        def block_queries(execute, sql, params, many, context):
+            raise CommandError(f"{label} ran a query while rendering: {sql}")
+
+        timings = []
+        with connection.execute_wrapper(block_queries):
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                html = template.render(context, request)
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"{label:<22} {size:>6} {len(html) / 1024:>8.1f} {min(timings) * 1000:>8.2f} "
+            f"{statistics.median(timings) * 1000:>10.2f} {statistics.mean(timings) * 1000:>8.2f}"
+        )
+
+    def make_service(self, i, provider):
+        return Service(
+            pk=i, name=f"Service {i}", description="Professional home maintenance and repair. " * 10,
+            price=Decimal('49.99'), provider=provider, average_rating=4.2, review_count=40,
+            rating_1_count=2, rating_2_count=3, rating_3_count=5, rating_4_count=10, rating_5_count=20,
+        )
+
+    def make_booking(self, i, service, customer):
+        statuses = ['PENDING', 'CONFIRMED', 'COMPLETED', 'CANCELLED']
+        booking = Booking(
+            pk=i, service=service, customer=customer,
+            date=timezone.now() + timedelta(days=i % 30), status=statuses[i % 4],
+        )
+        # Mark the reverse one-to-one as loaded (no review) so the template
+        # doesn't query for it.
+        booking._state.fields_cache['review'] = None
+        return booking
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from whitenoise.compress import Compressor
+
+from booking.models import Service
+from booking.snapshot import CATALOG_URL, MANIFEST_NAME, read_manifest, snapshot_root
+from booking.views import get_review_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the public home page, service pages and a JSON catalog into "
+        "STATIC_ROOT/catalog/ for anonymous visitors. Only services changed since "
+        "the last snapshot are re-rendered unless --full is given. With --watch the "
+        "snapshot is kept up to date by rebuilding every few seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Re-render every service page.")
+        parser.add_argument(
+            '--watch', type=float, metavar='SECONDS',
+            help="Keep running and rebuild the snapshot every SECONDS seconds.",
+        )
+
+    def handle(self, *args, **options):
+        self.compressor = Compressor(quiet=True)
+        self.build(full=options['full'])
+        if not options['watch']:
+            return
+        while True:
+            time.sleep(options['watch'])
+            close_old_connections()
+            try:
+                self.build(full=False, quiet=True)
+            except DatabaseError as error:
+                # Keep serving the last snapshot and try again next round.
+                self.stderr.write(f"Catalog snapshot rebuild failed: {error}")
+
+    def build(self, full, quiet=False):
+        root = snapshot_root()
+        os.makedirs(os.path.join(root, 'service'), exist_ok=True)
+        current = read_manifest()
+        previous = current
+        if full:
+            previous = {'built_at': None, 'pages': {}, 'catalog': None, 'services': {}}
+        built_at = timezone.now().timestamp()
+
+        services = list(Service.objects.select_related('provider').order_by('id'))
+        pages = {}
+        versions = {}
+        rendered = 0
+        for service in services:
+            url = reverse('booking:service_detail', args=[service.pk])
+            version = service.updated_at.timestamp()
+            versions[str(service.pk)] = version
+            if previous['services'].get(str(service.pk)) == version and url in previous['pages']:
+                pages[url] = previous['pages'][url]
+                continue
+            reviews, next_cursor = get_review_page(service)
+            pages[url] = self.render(f'service/{service.pk}', 'html', 'booking/service_detail.html', url, {
+                'service': service,
+                'reviews': reviews,
+                'next_cursor': next_cursor,
+                'histogram': service.rating_histogram(),
+                'title': service.name,
+            })
+            rendered += 1
+
+        home_url = reverse('booking:home')
+        catalog = previous['catalog']
+        if (
+            rendered or versions != previous['services']
+            or home_url not in previous['pages'] or CATALOG_URL not in previous['pages']
+        ):
+            pages[home_url] = self.render('home', 'html', 'booking/home.html', home_url, {
+                'services': services, 'title': 'Home',
+            })
+            catalog = self.write('catalog', 'json', json.dumps([
+                {
+                    'id': service.pk,
+                    'name': service.name,
+                    'description': service.description,
+                    'price': service.price,
+                    'average_rating': service.average_rating,
+                    'review_count': service.review_count,
+                    'url': reverse('booking:service_detail', args=[service.pk]),
+                }
+                for service in services
+            ], cls=DjangoJSONEncoder))
+        else:
+            pages[home_url] = previous['pages'][home_url]
+        pages[CATALOG_URL] = catalog
+
+        if pages == current['pages'] and catalog == current['catalog'] and versions == current['services']:
+            if not quiet:
+                self.stdout.write("Catalog snapshot is up to date.")
+            return
+        manifest = {'built_at': built_at, 'pages': pages, 'catalog': catalog, 'services': versions}
+        self.write_manifest(root, manifest)
+        removed = self.remove_stale_files(root, manifest, current)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} of {len(services)} service page(s); removed {removed} stale file(s)."
+        ))
+
+    def render(self, name, extension, template, url, context):
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        return self.write(name, extension, render_to_string(template, context, request=request))
+
+    def write(self, name, extension, content):
+        data = content.encode()
+        filename = f'{name}.{hashlib.sha256(data).hexdigest()[:12]}.{extension}'
+        path = os.path.join(snapshot_root(), filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            list(self.compressor.compress(path))
+        return filename
+
+    def write_manifest(self, root, manifest):
+        # Swap the manifest in atomically so workers never read a partial one.
+        path = os.path.join(root, MANIFEST_NAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def remove_stale_files(self, root, manifest, previous):
+        # Keep the previous generation too: workers may still be serving it
+        # until they notice the new manifest.
+        keep = {MANIFEST_NAME}
+        for snapshot in (manifest, previous):
+            names = list(snapshot['pages'].values()) + [snapshot['catalog']]
+            keep.update(name for name in names if name)
+        removed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name.endswith(('.gz', '.br')):
+                    name = name[:-3]
+                if name not in keep:
+                    os.remove(path)
+                    removed += 1
+        return removed
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from booking.metrics import EMAILS_SENT
+from booking.models import Booking, ProviderDigest
+
+
+class Command(BaseCommand):
+    help = "Email each provider one digest of their new, changed and cancelled bookings since the last digest."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--initial-days', type=int, default=1,
+            help="How far back to look for providers that have never had a digest.",
+        )
+        parser.add_argument(
+            '--lag', type=int, default=60,
+            help="Leave bookings touched in the last LAG seconds for the next run.",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Render the digests without sending them.")
+
+    def handle(self, *args, **options):
+        # Everything up to the cutoff goes out now; bookings touched later
+        # are left for the next run, so re-running never sends twice.
+        # updated_at is set in Python before the transaction commits, so a
+        # booking still being saved can carry a timestamp just before now:
+        # the lag keeps the cutoff behind any such in-flight write.
+        cutoff = timezone.now() - timedelta(seconds=options['lag'])
+        initial = cutoff - timedelta(days=options['initial_days'])
+
+        watermark = ProviderDigest.objects.filter(provider=OuterRef('service__provider')).values('last_sent_at')
+        bookings = (
+            Booking.objects
+            .annotate(since=Coalesce(Subquery(watermark), Value(initial)))
+            .filter(updated_at__gt=F('since'), updated_at__lte=cutoff)
+            .exclude(service__provider__email='')
+            .select_related('service__provider', 'customer')
+            .order_by('service__provider_id', 'updated_at')
+        )
+
+        messages = []
+        for provider_id, group in groupby(bookings, key=lambda booking: booking.service.provider_id):
+            group = list(group)
+            provider = group[0].service.provider
+            since = group[0].since
+            context = {'provider': provider, 'since': since, 'new': [], 'changed': [], 'cancelled': []}
+            for booking in group:
+                if booking.status == 'CANCELLED':
+                    context['cancelled'].append(booking)
+                elif booking.created_at > since:
+                    context['new'].append(booking)
+                else:
+                    context['changed'].append(booking)
+            body = render_to_string('booking/emails/provider_digest.txt', context)
+            messages.append((provider, EmailMessage(
+                'Your Justbookit booking digest', body, 'noreply@servicebooking.com', [provider.email],
+            )))
+
+        if options['dry_run']:
+            for provider, message in messages:
+                self.stdout.write(f"--- {provider.email}\n{message.body}")
+            return
+
+        sent = 0
+        # One SMTP session for the whole run. Messages go out one at a time
+        # so each provider's watermark only advances once their digest is sent.
+        with get_connection() as connection:
+            for provider, message in messages:
+                if connection.send_messages([message]):
+                    ProviderDigest.objects.update_or_create(provider=provider, defaults={'last_sent_at': cutoff})
+                    sent += 1
+        EMAILS_SENT.labels('provider_digest').inc(sent)
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} provider digest(s)."))
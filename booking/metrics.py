@@ -0,0 +1,97 @@
+"""
+Prometheus metrics for the booking app.
+
+The metrics are collected in multiprocess mode: every gunicorn worker writes
+its samples to memory-mapped files under PROMETHEUS_MULTIPROC_DIR (set in
+settings) and the /metrics view aggregates them across workers.
+"""
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+
+REQUEST_LATENCY = Histogram(
+    'justbookit_request_latency_seconds',
+    'Request latency by URL name.',
+    ['view', 'method'],
+)
+REQUESTS = Counter(
+    'justbookit_requests_total',
+    'Requests by URL name and response status.',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Counter(
+    'justbookit_db_queries_total',
+    'Database queries executed, by URL name.',
+    ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'justbookit_cache_requests_total',
+    'Cache lookups by result (hit or miss).',
+    ['result'],
+)
+BOOKINGS_CREATED = Counter(
+    'justbookit_bookings_created_total',
+    'Bookings created.',
+)
+EMAILS_SENT = Counter(
+    'justbookit_emails_sent_total',
+    'Emails handed to the mail backend, by kind.',
+    ['kind'],
+)
+LOGIN_FAILURES = Counter(
+    'justbookit_login_failures_total',
+    'Failed login attempts.',
+)
+
+LOAD_SHEDDING_IN_FLIGHT = Gauge(
+    'justbookit_load_shedding_in_flight',
+    'Requests currently running, by route class.',
+    ['route_class'],
+    multiprocess_mode='livesum',
+)
+LOAD_SHEDDING_QUEUE_DEPTH = Gauge(
+    'justbookit_load_shedding_queue_depth',
+    'Requests waiting for a slot, by route class.',
+    ['route_class'],
+    multiprocess_mode='livesum',
+)
+LOAD_SHEDDING_SHED = Counter(
+    'justbookit_load_shedding_shed_total',
+    'Requests rejected with 503, by route class and reason (queue_full or timeout).',
+    ['route_class', 'reason'],
+)
+
+DB_POOL = Gauge(
+    'justbookit_db_pool',
+    'psycopg connection pool statistics (see psycopg_pool get_stats()).',
+    ['stat'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_STATS = (
+    'pool_min', 'pool_max', 'pool_size', 'pool_available', 'requests_waiting',
+    'requests_num', 'requests_queued', 'requests_wait_ms', 'requests_errors',
+    'connections_num', 'connections_ms', 'connections_errors', 'connections_lost',
+)
+
+
+def record_pool_stats(connection):
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return
+    stats = pool.get_stats()
+    for stat in DB_POOL_STATS:
+        DB_POOL.labels(stat).set(stats.get(stat, 0))
+
+SUGGEST_INDEX = Gauge(
+    'justbookit_suggest_index',
+    'Search suggestion index size (keys, services, memory_bytes, ...), largest worker.',
+    ['stat'],
+    multiprocess_mode='max',
+)
+
+
+def render_metrics():
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
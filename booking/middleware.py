@@ -0,0 +1,51 @@
+import time
+
+from django.db import connection
+from django.urls import Resolver404, resolve
+
+from .metrics import DB_QUERIES, REQUEST_LATENCY, REQUESTS, record_pool_stats
+
+
+# Anything else is labelled "other", so clients can't create new series.
+METRIC_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def resolve_view_name(request):
+    # Cached on the request: LoadSheddingMiddleware needs the view name before
+    # the URL is resolved for the view, and MetricsMiddleware needs it even
+    # when a request was shed.
+    if not hasattr(request, '_booking_view_name'):
+        try:
+            request._booking_view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            request._booking_view_name = None
+    return request._booking_view_name
+
+
+class MetricsMiddleware:
+    """Record latency, status and query count for every request, labelled by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = resolve_view_name(request) or '<unresolved>'
+        method = request.method if request.method in METRIC_METHODS else 'other'
+        REQUEST_LATENCY.labels(view, method).observe(elapsed)
+        REQUESTS.labels(view, method, response.status_code).inc()
+        if queries:
+            DB_QUERIES.labels(view).inc(queries)
+            record_pool_stats(connection)
+        return response
@@ -0,0 +1,89 @@
+# Generated by Django 5.1 on 2026-10-19 14:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill_histogram(apps, schema_editor):
+    Service = apps.get_model('booking', 'Service')
+    Review = apps.get_model('booking', 'Review')
+    rows = (
+        Review.objects.values('booking__service_id', 'rating')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    histograms = {}
+    for row in rows:
+        histograms.setdefault(row['booking__service_id'], {})[row['rating']] = row['count']
+    for service_id, counts in histograms.items():
+        total = sum(counts.values())
+        Service.objects.filter(pk=service_id).update(
+            review_count=total,
+            average_rating=sum(stars * count for stars, count in counts.items()) / total,
+            **{f'rating_{stars}_count': counts.get(stars, 0) for stars in range(1, 6)},
+        )
+
+
+def backfill_review_service(apps, schema_editor):
+    Booking = apps.get_model('booking', 'Booking')
+    Review = apps.get_model('booking', 'Review')
+    Review.objects.update(
+        service_id=Subquery(Booking.objects.filter(pk=OuterRef('booking_id')).values('service_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_alter_booking_customer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='service',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='booking.service'),
+        ),
+        migrations.RunPython(backfill_review_service, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='review',
+            name='service',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='booking.service'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['service', '-created_at', '-id'], name='review_service_created_idx'),
+        ),
+        migrations.RunPython(backfill_histogram, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1 on 2026-10-19 14:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_digest_watermarks(apps, schema_editor):
+    # Existing bookings all get the migration time as created_at/updated_at,
+    # so without a watermark the first digest would list them all as new.
+    Booking = apps.get_model('booking', 'Booking')
+    ProviderDigest = apps.get_model('booking', 'ProviderDigest')
+    now = timezone.now()
+    provider_ids = Booking.objects.values_list('service__provider_id', flat=True).distinct()
+    ProviderDigest.objects.bulk_create(
+        [ProviderDigest(provider_id=provider_id, last_sent_at=now) for provider_id in provider_ids]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_service_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ProviderDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_sent_at', models.DateTimeField()),
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='digest', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(seed_digest_watermarks, migrations.RunPython.noop),
+    ]
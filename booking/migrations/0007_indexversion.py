@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+def create_suggest_counter(apps, schema_editor):
+    # Created up front so concurrent first bumps don't race on the insert.
+    IndexVersion = apps.get_model('booking', 'IndexVersion')
+    IndexVersion.objects.get_or_create(name='suggest_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_suggest_counter, migrations.RunPython.noop),
+    ]
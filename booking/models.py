@@ -16,11 +16,27 @@ class Service(models.Model):
     # end_date = models.DateTimeField()
     provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='services')
     average_rating = models.FloatField(default=0, validators=[MinValueValidator(0), MaxValueValidator(5)])
+    # Rating histogram, maintained incrementally by the Review signals.
+    review_count = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def clean(self):
         if not self.provider.is_professional:
             raise ValidationError("Only professional users can create services.")
 
+    def rating_histogram(self):
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}_count')
+            percent = round(100 * count / self.review_count) if self.review_count else 0
+            histogram.append({'stars': stars, 'count': count, 'percent': percent})
+        return histogram
+
 
 class Booking(models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='bookings')
@@ -33,16 +49,61 @@ class Booking(models.Model):
         ('CANCELLED', 'Cancelled'),
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def clean(self):
         if hasattr(self, 'customer') and self.customer == self.service.provider:
             raise ValidationError("Users cannot book their own services.")
 
+
+class ProviderDigest(models.Model):
+    # Watermark for send_provider_digests: bookings updated after
+    # last_sent_at go into the provider's next digest.
+    provider = models.OneToOneField(User, on_delete=models.CASCADE, related_name='digest')
+    last_sent_at = models.DateTimeField()
+
+
+class IndexVersion(models.Model):
+    # Shared version counters for per-process indexes (e.g. search
+    # suggestions). Bumped with a row lock so every write gets its own number.
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+
+class IdempotencyKey(models.Model):
+    # Records which booking a client-supplied key produced, so a repeated
+    # submission with the same key returns the original result.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+
 class Review(models.Model):
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='review')
+    # Copied from booking.service so a service's reviews can be paged from a
+    # single index without joining Booking.
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='reviews', editable=False)
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', '-created_at', '-id'], name='review_service_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.service_id is None:
+            self.service_id = self.booking.service_id
+        super().save(*args, **kwargs)
 
     def clean(self):
         if self.booking.status != 'COMPLETED':
@@ -0,0 +1,181 @@
+"""
+Opt-in per-request profiler for staff.
+
+A staff user adds ``?_profile=<token>`` (or an ``X-Profile`` header) to any
+request, where the token comes from the staff profiles page. The request is
+then run under cProfile, optionally with tracemalloc (``_profile_memory=1``
+or ``X-Profile-Memory: 1``), and the result is written to PROFILER_DIR:
+
+    <id>.prof       pstats dump, for snakeviz / pstats
+    <id>.collapsed  caller;callee edges weighted by microseconds, for flame graphs
+    <id>.json       request info, SQL timeline and top allocations
+
+Requests without the parameter or header only pay for two dict lookups.
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+MEMORY_QUERY_PARAM = '_profile_memory'
+MEMORY_HEADER = 'HTTP_X_PROFILE_MEMORY'
+SALT = 'booking.profiler'
+TOKEN_MAX_AGE = 60 * 60
+
+# tracemalloc is process-wide while workers serve requests on several
+# threads, so only one profiled request at a time may start and stop it.
+_tracemalloc_lock = threading.Lock()
+
+
+def make_token(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def token_is_valid(token, user):
+    try:
+        user_pk = signing.TimestampSigner(salt=SALT).unsign(token, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return user.is_staff and user_pk == str(user.pk)
+
+
+def profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILER_DIR, f'{profile_id}.{extension}')
+
+
+def recent_profiles():
+    if not os.path.isdir(settings.PROFILER_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(settings.PROFILER_DIR):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(settings.PROFILER_DIR, filename)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Pruned by another request, or not ours.
+                continue
+    profiles.sort(key=lambda profile: profile['started_at'], reverse=True)
+    return profiles
+
+
+def _prune():
+    for profile in recent_profiles()[settings.PROFILER_KEEP:]:
+        for extension in ('prof', 'collapsed', 'json'):
+            try:
+                os.remove(profile_path(profile['id'], extension))
+            except FileNotFoundError:
+                pass
+
+
+def _collapsed_stacks(stats):
+    # cProfile only records caller -> callee edges, not full stacks, so each
+    # line is a two-frame stack weighted by the time spent in the callee.
+    def label(func):
+        filename, line, name = func
+        return f'{name} ({os.path.basename(filename)}:{line})'
+
+    lines = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, total_time, _) in callers.items():
+            weight = int(total_time * 1_000_000)
+            if weight:
+                lines.append(f'{label(caller)};{label(func)} {weight}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProfilerMiddleware:
+    """Profile requests from staff users that carry a valid profiler token."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+        if not token or not token_is_valid(token, request.user):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        track_memory = bool(request.GET.get(MEMORY_QUERY_PARAM) or request.META.get(MEMORY_HEADER))
+        queries = []
+        started = time.perf_counter()
+
+        def record_query(execute, sql, params, many, context):
+            query_started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({
+                    'start_ms': (query_started - started) * 1000,
+                    'duration_ms': (time.perf_counter() - query_started) * 1000,
+                    'sql': sql,
+                })
+
+        memory_note = None
+        if track_memory:
+            if not _tracemalloc_lock.acquire(blocking=False):
+                track_memory, memory_note = False, 'skipped: another request is tracking memory'
+            elif tracemalloc.is_tracing():
+                # Started outside the profiler (e.g. PYTHONTRACEMALLOC); leave it alone.
+                _tracemalloc_lock.release()
+                track_memory, memory_note = False, 'skipped: tracemalloc was already running'
+            else:
+                tracemalloc.start()
+                # Allocations from other threads serving requests meanwhile
+                # are included too.
+                memory_note = 'includes allocations from concurrent requests'
+        profiler = cProfile.Profile()
+        with connection.execute_wrapper(record_query):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                if track_memory:
+                    snapshot = tracemalloc.take_snapshot()
+                    tracemalloc.stop()
+                    _tracemalloc_lock.release()
+        duration = time.perf_counter() - started
+        allocations = []
+        if track_memory:
+            for stat in snapshot.statistics('lineno')[:25]:
+                frame = stat.traceback[0]
+                allocations.append({'location': f'{frame.filename}:{frame.lineno}', 'size': stat.size, 'count': stat.count})
+
+        profile_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        profiler.dump_stats(profile_path(profile_id, 'prof'))
+        with open(profile_path(profile_id, 'collapsed'), 'w') as f:
+            f.write(_collapsed_stacks(pstats.Stats(profiler)))
+        # Swap the record in atomically: other profiled requests and the
+        # profiles page read every .json file.
+        path = profile_path(profile_id, 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'id': profile_id,
+                'started_at': time.time() - duration,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'user': request.user.get_username(),
+                'status': response.status_code,
+                'duration_ms': duration * 1000,
+                'queries': queries,
+                'allocations': allocations,
+                'memory_note': memory_note,
+            }, f)
+        os.replace(path + '.tmp', path)
+        _prune()
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,86 @@
+from django.contrib.auth.signals import user_login_failed
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Now
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Service, Booking, Review
+from .metrics import BOOKINGS_CREATED, LOGIN_FAILURES
+from .suggest import suggest_index
+from .catalog import touch_catalog
+
+
+@receiver(pre_save, sender=Service)
+def service_pre_save(sender, instance, **kwargs):
+    instance._previous_name = None
+    if instance.pk:
+        instance._previous_name = (
+            Service.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, created, **kwargs):
+    # Only names are indexed; other edits must not make every worker rebuild.
+    if created or getattr(instance, '_previous_name', None) != instance.name:
+        service_id, name = instance.pk, instance.name
+        transaction.on_commit(lambda: suggest_index.service_saved(service_id, name))
+    transaction.on_commit(touch_catalog)
+
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    service_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.service_deleted(service_id))
+    transaction.on_commit(touch_catalog)
+
+
+def update_rating_histogram(service_id, rating, delta):
+    # Single UPDATE using the old column values, so concurrent reviews
+    # never read-modify-write the histogram.
+    Service.objects.filter(pk=service_id).update(
+        average_rating=Case(
+            When(review_count=-delta, then=Value(0.0)),
+            default=(F('average_rating') * F('review_count') + delta * rating) / (F('review_count') + delta),
+        ),
+        review_count=F('review_count') + delta,
+        **{f'rating_{rating}_count': F(f'rating_{rating}_count') + delta},
+        updated_at=Now(),
+    )
+    transaction.on_commit(touch_catalog)
+
+
+@receiver(pre_save, sender=Review)
+def review_pre_save(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    service_id = instance.service_id
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        update_rating_histogram(service_id, instance.rating, 1)
+    elif previous != instance.rating:
+        update_rating_histogram(service_id, previous, -1)
+        update_rating_histogram(service_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    update_rating_histogram(instance.service_id, instance.rating, -1)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    if created:
+        BOOKINGS_CREATED.inc()
+
+
+@receiver(user_login_failed)
+def login_failed(sender, credentials, **kwargs):
+    LOGIN_FAILURES.inc()
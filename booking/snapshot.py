@@ -0,0 +1,133 @@
+"""
+Pre-rendered catalog snapshot, written by ``manage.py build_catalog_snapshot``.
+
+The snapshot lives under STATIC_ROOT/catalog/ as content-hashed, compressed
+files plus a manifest mapping page URLs to them. CatalogSnapshotMiddleware
+replaces WhiteNoiseMiddleware: it serves everything WhiteNoise does, plus
+snapshot pages for anonymous visitors (no session cookie, no query string),
+before the session, auth and CSRF middleware or any view run. The JSON
+catalog is served to everyone at CATALOG_URL.
+
+Each host keeps its snapshot current with ``build_catalog_snapshot --watch``,
+which gunicorn.conf.py starts alongside the workers; pages lag the database
+by at most CATALOG_SNAPSHOT_INTERVAL seconds plus one render.
+"""
+import json
+import os
+import re
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+SNAPSHOT_DIR = 'catalog'
+MANIFEST_NAME = 'manifest.json'
+CATALOG_URL = '/catalog.json'
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.(html|json)$')
+
+
+def snapshot_root():
+    return os.path.join(settings.STATIC_ROOT, SNAPSHOT_DIR)
+
+
+def read_manifest():
+    try:
+        with open(os.path.join(snapshot_root(), MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'built_at': None, 'pages': {}, 'catalog': None, 'services': {}}
+
+
+class CatalogSnapshotMiddleware(WhiteNoiseMiddleware):
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.pages = {}
+        self.snapshot_files = {}
+        self.manifest_mtime = None
+        self.manifest_checked_at = 0.0
+
+    @property
+    def snapshot_prefix(self):
+        return f'{self.static_prefix}{SNAPSHOT_DIR}/'
+
+    def add_file_to_dictionary(self, url, path, stat_cache=None):
+        # The snapshot changes while the server runs, so it is left out of
+        # WhiteNoise's startup scan and only served by __call__ below, which
+        # checks the file on disk.
+        if url.startswith(self.snapshot_prefix):
+            return
+        super().add_file_to_dictionary(url, path, stat_cache=stat_cache)
+
+    def immutable_file_test(self, path, url):
+        # Snapshot files carry a content hash in their name.
+        if url.startswith(self.snapshot_prefix) and HASHED_NAME_RE.search(url):
+            return True
+        return super().immutable_file_test(path, url)
+
+    def refresh_manifest(self):
+        now = time.monotonic()
+        if now - self.manifest_checked_at < 1:
+            return
+        self.manifest_checked_at = now
+        try:
+            mtime = os.stat(os.path.join(snapshot_root(), MANIFEST_NAME)).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.manifest_mtime:
+            self.manifest_mtime = mtime
+            self.pages = read_manifest()['pages']
+            self.snapshot_files = {}
+
+    def snapshot_file(self, name, url):
+        # Snapshot files never change in place (the name holds the hash), so
+        # the StaticFile built from a single stat can be reused until the
+        # manifest changes.
+        key = (name, url)
+        if key not in self.snapshot_files:
+            self.snapshot_files[key] = self.get_static_file(os.path.join(snapshot_root(), name), url)
+        return self.snapshot_files[key]
+
+    def serve_snapshot(self, name, url, request):
+        response = self.serve(self.snapshot_file(name, url), request)
+        # Returned before XFrameOptionsMiddleware runs, so set it here.
+        response.setdefault('X-Frame-Options', getattr(settings, 'X_FRAME_OPTIONS', 'DENY').upper())
+        return response
+
+    def is_anonymous_page_request(self, request):
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.META.get('QUERY_STRING')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def __call__(self, request):
+        path = request.path_info
+        if path.startswith(self.snapshot_prefix):
+            self.refresh_manifest()
+            name = path[len(self.snapshot_prefix):]
+            if (
+                self.url_is_canonical(path)
+                and HASHED_NAME_RE.search(name)
+                and os.path.isfile(os.path.join(snapshot_root(), name))
+            ):
+                return self.serve_snapshot(name, path, request)
+            # Removed or never part of a snapshot: a plain 404, never
+            # WhiteNoise's own lookup.
+            return self.get_response(request)
+        if path == CATALOG_URL and request.method in ('GET', 'HEAD'):
+            # Not personalised and there is no dynamic version, so every
+            # visitor gets the snapshot.
+            self.refresh_manifest()
+            if path in self.pages:
+                return self.serve_snapshot(self.pages[path], path, request)
+        elif self.is_anonymous_page_request(request):
+            self.refresh_manifest()
+            if path in self.pages:
+                response = self.serve_snapshot(self.pages[path], path, request)
+                # Logged-in users (with a session cookie) get the dynamic page.
+                patch_vary_headers(response, ['Cookie'])
+                return response
+        return super().__call__(request)
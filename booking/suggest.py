@@ -0,0 +1,219 @@
+"""
+In-process prefix index over Service.name used by the search-as-you-type
+endpoint. Keys are kept in a sorted list and looked up with bisect, so a
+suggestion never touches the database once the index is built.
+
+Every worker keeps its own copy. Local writes are applied incrementally from
+the Service signals and bump a version counter in the database (IndexVersion);
+other workers notice the new version on their next lookup and rebuild. The
+number of keys is capped by SUGGEST_INDEX_MAX_KEYS and the index size is
+exported on /metrics.
+"""
+import bisect
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from .metrics import SUGGEST_INDEX
+
+
+VERSION_NAME = 'suggest_index'
+
+
+def _keys_for(name):
+    # Index the full name and every word start, so "clean" also matches
+    # "House Cleaning".
+    words = name.lower().split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held while rebuilding, so only one thread per worker rebuilds.
+        self._build_lock = threading.Lock()
+        self._keys = []
+        self._ids = []
+        self._names = {}
+        self._version = None
+        self._built = False
+        self._checked_at = 0.0
+        self._build_seconds = 0.0
+        self._truncated = False
+
+    def build(self):
+        from .models import Service
+
+        started = time.perf_counter()
+        # Read the version first: a write that lands during the query bumps
+        # it past ours, so the next check rebuilds again.
+        version = current_version()
+        full_names = []
+        word_starts = []
+        for service_id, name in Service.objects.values_list('id', 'name').iterator():
+            keys = _keys_for(name)
+            full_names.extend((key, service_id, name) for key in keys[:1])
+            word_starts.extend((key, service_id, name) for key in keys[1:])
+        # Full names take priority over word starts when the cap is reached.
+        limit = settings.SUGGEST_INDEX_MAX_KEYS
+        entries = full_names[:limit] + word_starts[:max(0, limit - len(full_names))]
+        entries.sort()
+        with self._lock:
+            self._keys = [key for key, _, _ in entries]
+            self._ids = [service_id for _, service_id, _ in entries]
+            self._names = {service_id: name for _, service_id, name in entries}
+            self._version = version
+            self._built = True
+            self._truncated = len(full_names) + len(word_starts) > limit
+            self._checked_at = time.monotonic()
+            self._build_seconds = time.perf_counter() - started
+            self.publish_stats()
+
+    def warm_up(self):
+        # Called at worker start; the table may not exist yet before the
+        # first migrate, in which case the index is built lazily instead.
+        try:
+            with self._build_lock:
+                self.build()
+        except DatabaseError:
+            pass
+
+    def _ensure_fresh(self):
+        if self._version is None:
+            # Nothing to answer from yet, so wait for the first build.
+            with self._build_lock:
+                if self._version is None:
+                    self.build()
+            return
+        stale = not self._built
+        if not stale:
+            interval = getattr(settings, 'SUGGEST_VERSION_CHECK_INTERVAL', 2)
+            now = time.monotonic()
+            if now - self._checked_at < interval:
+                return
+            self._checked_at = now
+            stale = current_version() != self._version
+        # One thread rebuilds; the others keep answering from the current
+        # index instead of queueing behind it.
+        if stale and self._build_lock.acquire(blocking=False):
+            try:
+                self.build()
+            finally:
+                self._build_lock.release()
+
+    def lookup(self, prefix, limit=10):
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        self._ensure_fresh()
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                if not self._keys[position].startswith(prefix):
+                    break
+                service_id = self._ids[position]
+                if service_id not in seen:
+                    seen.add(service_id)
+                    results.append((service_id, self._names[service_id]))
+                position += 1
+        return results
+
+    def _remove(self, service_id):
+        name = self._names.pop(service_id, None)
+        if name is None:
+            return
+        for key in _keys_for(name):
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == service_id:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+    def _apply(self, version):
+        # Only trust our incremental state if no other worker has written in
+        # between; otherwise fall back to a rebuild on the next lookup.
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+            SUGGEST_INDEX.labels('keys').set(len(self._keys))
+            SUGGEST_INDEX.labels('services').set(len(self._names))
+        else:
+            self._built = False
+
+    def service_saved(self, service_id, name):
+        version = bump_version()
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(service_id)
+            keys = _keys_for(name)
+            if len(self._keys) + len(keys) > settings.SUGGEST_INDEX_MAX_KEYS:
+                # Let the rebuild decide which keys fit under the cap.
+                self._built = False
+                return
+            self._names[service_id] = name
+            for key in keys:
+                # Insert after equal keys to keep the build() order by id.
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._ids.insert(position, service_id)
+            self._apply(version)
+
+    def service_deleted(self, service_id):
+        version = bump_version()
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(service_id)
+            self._apply(version)
+
+    def stats(self):
+        with self._lock:
+            memory = (
+                sys.getsizeof(self._keys)
+                + sys.getsizeof(self._ids)
+                + sys.getsizeof(self._names)
+                + sum(sys.getsizeof(key) for key in self._keys)
+                + sum(sys.getsizeof(name) for name in self._names.values())
+            )
+            return {
+                'version': self._version or 0,
+                'services': len(self._names),
+                'keys': len(self._keys),
+                'max_keys': settings.SUGGEST_INDEX_MAX_KEYS,
+                'truncated': int(self._truncated),
+                'memory_bytes': memory,
+                'build_seconds': self._build_seconds,
+            }
+
+    def publish_stats(self):
+        for stat, value in self.stats().items():
+            SUGGEST_INDEX.labels(stat).set(value)
+
+
+def current_version():
+    from .models import IndexVersion
+
+    return IndexVersion.objects.filter(name=VERSION_NAME).values_list('version', flat=True).first() or 0
+
+
+def bump_version():
+    # The row lock makes concurrent bumps from different workers get
+    # distinct numbers, so a worker can tell whether it missed a write.
+    from .models import IndexVersion
+
+    with transaction.atomic():
+        counter, _ = IndexVersion.objects.select_for_update().get_or_create(name=VERSION_NAME)
+        counter.version += 1
+        counter.save(update_fields=['version'])
+    return counter.version
+
+
+suggest_index = PrefixIndex()
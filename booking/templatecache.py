@@ -0,0 +1,20 @@
+import os
+
+from django.apps import apps
+from django.template.loader import get_template
+
+
+def booking_template_names():
+    root = os.path.join(apps.get_app_config('booking').path, 'templates')
+    names = []
+    for directory, _, filenames in os.walk(os.path.join(root, 'booking')):
+        for filename in filenames:
+            names.append(os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def precompile_templates():
+    # Loading a template through the cached loader compiles it (and the
+    # templates it extends) once, so the first request doesn't pay for it.
+    for name in booking_template_names():
+        get_template(name)
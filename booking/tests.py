@@ -1,3 +1,568 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.utils import timezone
+from prometheus_client.parser import text_string_to_metric_families
+
+from . import profiler
+from .catalog import VERSION_CACHE_KEY
+from .loadshedding import LoadSheddingMiddleware, RouteLimiter
+from .middleware import MetricsMiddleware
+from .models import User, Service, Booking, Review, IdempotencyKey, ProviderDigest
+from .snapshot import read_manifest
+from .suggest import PrefixIndex, current_version
+from .views import REVIEWS_PER_PAGE, get_review_page
+
+
+class IdempotentBookingTests(TestCase):
+
+    def setUp(self):
+        provider = User.objects.create_user('provider', password='x', is_professional=True)
+        self.customer = User.objects.create_user('customer', email='customer@example.com', password='x')
+        self.service = Service.objects.create(name='Cleaning', description='Home cleaning', price=10, provider=provider)
+        self.client.force_login(self.customer)
+        self.url = f'/service/{self.service.pk}/book/'
+
+    def test_form_issues_key(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'name="idempotency_key"')
+
+    def test_repeated_submission_returns_original_result(self):
+        data = {'date': '2030-01-01T10:00', 'idempotency_key': 'abc'}
+        first = self.client.post(self.url, data)
+        second = self.client.post(self.url, data)
+        self.assertRedirects(first, '/dashboard/', fetch_redirect_response=False)
+        self.assertRedirects(second, '/dashboard/', fetch_redirect_response=False)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_replay_skips_validation(self):
+        self.client.post(self.url, {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(self.url, {'date': 'not a date'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_reused_for_another_service_is_rejected(self):
+        other = Service.objects.create(name='Gardening', description='x', price=10, provider=self.service.provider)
+        self.client.post(self.url, {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        response = self.client.post(f'/service/{other.pk}/book/', {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_key_books_again(self):
+        self.client.post(self.url, {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(self.url, {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.get().booking, Booking.objects.latest('pk'))
+
+    def test_different_keys_create_separate_bookings(self):
+        self.client.post(self.url, {'date': '2030-01-01T10:00', 'idempotency_key': 'one'})
+        self.client.post(self.url, {'date': '2030-01-01T10:00', 'idempotency_key': 'two'})
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+class ConcurrentIdempotentBookingTests(TransactionTestCase):
+
+    def test_same_key_from_many_threads_books_once(self):
+        provider = User.objects.create_user('provider', password='x', is_professional=True)
+        customer = User.objects.create_user('customer', email='customer@example.com', password='x')
+        service = Service.objects.create(name='Cleaning', description='Home cleaning', price=10, provider=provider)
+        url = f'/service/{service.pk}/book/'
+        start = threading.Barrier(10)
+        statuses = []
+
+        def submit(client):
+            start.wait()
+            try:
+                response = client.post(url, {'date': '2030-01-01T10:00'}, HTTP_IDEMPOTENCY_KEY='same-key')
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        clients = []
+        for _ in range(10):
+            client = Client()
+            client.force_login(customer)
+            clients.append(client)
+        threads = [threading.Thread(target=submit, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [302] * 10)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ReviewTestMixin:
+
+    def setUp(self):
+        provider = User.objects.create_user('provider', password='x', is_professional=True)
+        self.customer = User.objects.create_user('customer', password='x')
+        self.service = Service.objects.create(name='Cleaning', description='x', price=10, provider=provider)
+
+    def add_review(self, rating):
+        booking = Booking.objects.create(
+            service=self.service, customer=self.customer, date=timezone.now(), status='COMPLETED',
+        )
+        return Review.objects.create(booking=booking, rating=rating, comment='x')
+
+
+class RatingHistogramTests(ReviewTestMixin, TestCase):
+
+    def assertHistogram(self, counts, average):
+        self.service.refresh_from_db()
+        self.assertEqual([self.service.rating_1_count, self.service.rating_2_count, self.service.rating_3_count,
+                          self.service.rating_4_count, self.service.rating_5_count], counts)
+        self.assertEqual(self.service.review_count, sum(counts))
+        self.assertAlmostEqual(self.service.average_rating, average)
+
+    def test_create(self):
+        self.add_review(5)
+        self.add_review(4)
+        self.add_review(4)
+        self.assertHistogram([0, 0, 0, 2, 1], 13 / 3)
+
+    def test_rating_change(self):
+        review = self.add_review(5)
+        self.add_review(3)
+        review.rating = 1
+        review.save()
+        self.assertHistogram([1, 0, 1, 0, 0], 2)
+
+    def test_saving_without_rating_change(self):
+        review = self.add_review(4)
+        review.comment = 'edited'
+        review.save()
+        self.assertHistogram([0, 0, 0, 1, 0], 4)
+
+    def test_delete(self):
+        review = self.add_review(5)
+        self.add_review(2)
+        review.delete()
+        self.assertHistogram([0, 1, 0, 0, 0], 2)
+        Review.objects.get().delete()
+        self.assertHistogram([0, 0, 0, 0, 0], 0)
+
+
+class ReviewPaginationTests(ReviewTestMixin, TestCase):
+
+    def test_pages_cover_every_review_once_in_order(self):
+        reviews = [self.add_review(5) for _ in range(REVIEWS_PER_PAGE * 2 + 5)]
+        # Half the reviews share a timestamp, so the id has to break ties.
+        now = timezone.now()
+        for i, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(created_at=now - timedelta(minutes=i // 2))
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            page, cursor = get_review_page(self.service, cursor)
+            seen.extend(review.pk for review in page)
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_only_this_services_reviews(self):
+        self.add_review(5)
+        other = Service.objects.create(name='Other', description='x', price=10, provider=self.service.provider)
+        Review.objects.create(
+            booking=Booking.objects.create(service=other, customer=self.customer, date=timezone.now()),
+            rating=1, comment='x',
+        )
+        page, cursor = get_review_page(self.service)
+        self.assertEqual([review.service_id for review in page], [self.service.pk])
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        review = self.add_review(5)
+        self.assertEqual(get_review_page(self.service, 'garbage'), ([review], None))
+
+
+class CatalogSnapshotTests(ReviewTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        override = override_settings(STATIC_ROOT=static_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def build(self):
+        out = io.StringIO()
+        call_command('build_catalog_snapshot', stdout=out)
+        return out.getvalue()
+
+    def test_rebuild_only_when_catalog_changed(self):
+        self.assertIn('Rendered 1 of 1', self.build())
+        self.assertIn('up to date', self.build())
+        self.add_review(4)
+        self.assertIn('Rendered 1 of 1', self.build())
+        self.assertEqual(len(read_manifest()['pages']), 3)
+
+    def test_removed_snapshot_files_are_not_found(self):
+        self.build()
+        url = f'/service/{self.service.pk}/'
+        first = read_manifest()['pages'][url]
+        client = Client()
+        # The middleware is set up on the first request, with the first
+        # snapshot already on disk.
+        self.assertEqual(client.get(f'/static/catalog/{first}').status_code, 200)
+        self.add_review(4)
+        self.build()
+        self.add_review(3)
+        self.build()
+        self.assertEqual(client.get(f'/static/catalog/{first}').status_code, 404)
+        self.assertEqual(client.get('/static/catalog/manifest.json').status_code, 404)
+        current = read_manifest()['pages'][url]
+        self.assertEqual(client.get(f'/static/catalog/{current}').status_code, 200)
+
+    def test_snapshot_pages_deny_framing(self):
+        self.build()
+        response = self.client.get(f'/service/{self.service.pk}/')
+        self.assertTrue(response.streaming)  # served from the snapshot
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+    def test_catalog_has_a_stable_url(self):
+        self.build()
+        catalog = self.client.get('/catalog.json')
+        self.assertEqual(catalog['Content-Type'], 'application/json')
+        self.assertEqual([entry['name'] for entry in json.loads(b''.join(catalog.streaming_content))], ['Cleaning'])
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get('/catalog.json').status_code, 200)
+
+    def test_service_pages_are_public(self):
+        for _ in range(REVIEWS_PER_PAGE + 1):
+            self.add_review(5)
+        _, cursor = get_review_page(self.service)
+        detail = self.client.get(f'/service/{self.service.pk}/', {'cursor': cursor})
+        self.assertContains(detail, 'Rating: 5/5', count=1)
+        listing = self.client.get(f'/service/{self.service.pk}/reviews/')
+        self.assertEqual(len(listing.json()['reviews']), REVIEWS_PER_PAGE)
+
+
+class CatalogCachingTests(TestCase):
+    # A query string keeps the pre-rendered snapshot out of the way.
+    url = '/search/?q=clean'
+
+    def setUp(self):
+        cache.delete(VERSION_CACHE_KEY)
+        self.provider = User.objects.create_user('provider', password='x', is_professional=True)
+        self.service = Service.objects.create(name='Cleaning', description='x', price=10, provider=self.provider)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_delete_changes_etag(self):
+        Service.objects.create(name='Window cleaning', description='x', price=10, provider=self.provider)
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_version_expires(self):
+        # A write handled by another host doesn't touch our cache; the
+        # cached version has to expire on its own.
+        with override_settings(CATALOG_VERSION_TTL=0.01):
+            etag = self.client.get(self.url)['ETag']
+        Service.objects.filter(pk=self.service.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        time.sleep(0.05)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ProfilerMemoryTests(TestCase):
+
+    def setUp(self):
+        self.profiler_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profiler_dir.cleanup)
+        override = override_settings(PROFILER_DIR=self.profiler_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.params = {profiler.QUERY_PARAM: profiler.make_token(staff), profiler.MEMORY_QUERY_PARAM: '1'}
+
+    def profile(self):
+        response = self.client.get('/dashboard/', self.params)
+        with open(profiler.profile_path(response['X-Profile-Id'], 'json')) as f:
+            return json.load(f)
+
+    def test_unreadable_records_are_skipped(self):
+        with open(os.path.join(self.profiler_dir.name, 'partial.json'), 'w') as f:
+            f.write('{"id": "partial", "start')
+        self.profile()
+        response = self.client.get('/profiles/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(profiler.recent_profiles()), 1)
+
+    def test_tracks_memory(self):
+        profile = self.profile()
+        self.assertTrue(profile['allocations'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_skips_memory_while_another_request_tracks_it(self):
+        with profiler._tracemalloc_lock:
+            profile = self.profile()
+        self.assertEqual(profile['allocations'], [])
+        self.assertIn('another request', profile['memory_note'])
+
+    def test_leaves_existing_tracing_alone(self):
+        tracemalloc.start()
+        try:
+            profile = self.profile()
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(profile['allocations'], [])
+
+
+class RouteLimiterTests(SimpleTestCase):
+
+    def test_sheds_when_queue_is_full(self):
+        limiter = RouteLimiter('test', concurrency=1, queue=0, timeout=1)
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(limiter.acquire(), 'queue_full')
+        limiter.release()
+        self.assertIsNone(limiter.acquire())
+
+    def test_sheds_after_waiting_too_long(self):
+        limiter = RouteLimiter('test', concurrency=1, queue=1, timeout=0.05)
+        self.assertIsNone(limiter.acquire())
+        self.assertEqual(limiter.acquire(), 'timeout')
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_release_hands_slot_to_waiting_request(self):
+        limiter = RouteLimiter('test', concurrency=1, queue=1, timeout=5)
+        self.assertIsNone(limiter.acquire())
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.waiting:
+            time.sleep(0.001)
+        limiter.release()
+        waiter.join()
+        self.assertEqual(results, [None])
+        self.assertEqual(limiter.active, 1)
+
+    def test_reads_use_all_threads_but_one_and_queue_the_rest(self):
+        limiter = LoadSheddingMiddleware(lambda request: HttpResponse()).limiters['read']
+        for _ in range(settings.WORKER_THREADS - 1):
+            self.assertIsNone(limiter.acquire())
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.waiting:
+            time.sleep(0.001)
+        limiter.release()
+        waiter.join()
+        self.assertEqual(results, [None])
+
+    def test_middleware_returns_503_with_retry_after(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        middleware.limiters['read'] = RouteLimiter('read', concurrency=0, queue=0, timeout=1, retry_after=7)
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+
+class ProviderDigestTests(TestCase):
+
+    def setUp(self):
+        self.provider = User.objects.create_user('provider', email='provider@example.com', password='x', is_professional=True)
+        self.customer = User.objects.create_user('customer', password='x')
+        self.service = Service.objects.create(name='Cleaning', description='x', price=10, provider=self.provider)
+
+    def add_booking(self, updated_ago, created_ago=None, status='PENDING', service=None):
+        booking = Booking.objects.create(
+            service=service or self.service, customer=self.customer, date=timezone.now(), status=status,
+        )
+        now = timezone.now()
+        Booking.objects.filter(pk=booking.pk).update(
+            created_at=now - (created_ago or updated_ago), updated_at=now - updated_ago,
+        )
+        return booking
+
+    def send(self):
+        call_command('send_provider_digests', stdout=io.StringIO())
+
+    def test_splits_new_changed_and_cancelled(self):
+        self.add_booking(timedelta(minutes=5))
+        self.add_booking(timedelta(minutes=5), created_ago=timedelta(days=3), status='CONFIRMED')
+        self.add_booking(timedelta(minutes=5), status='CANCELLED')
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+        body = mail.outbox[0].body
+        self.assertIn('New bookings (1)', body)
+        self.assertIn('Updated bookings (1)', body)
+        self.assertIn('Cancelled bookings (1)', body)
+
+    def test_rerun_sends_nothing(self):
+        self.add_booking(timedelta(minutes=5))
+        self.send()
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_recent_bookings_wait_for_the_next_run(self):
+        booking = self.add_booking(timedelta(seconds=1))
+        self.send()
+        self.assertEqual(len(mail.outbox), 0)
+        Booking.objects.filter(pk=booking.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_providers_without_email_are_skipped(self):
+        silent = User.objects.create_user('silent', password='x', is_professional=True)
+        other = Service.objects.create(name='Gardening', description='x', price=10, provider=silent)
+        self.add_booking(timedelta(minutes=5), service=other)
+        self.send()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(ProviderDigest.objects.exists())
+
+    def test_failed_send_keeps_the_watermark(self):
+        self.add_booking(timedelta(minutes=5))
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', return_value=0):
+            self.send()
+        self.assertFalse(ProviderDigest.objects.exists())
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(ProviderDigest.objects.filter(provider=self.provider).exists())
+
+
+class RequestMetricsTests(TestCase):
+    # Metric files are shared with earlier runs, so compare before and after.
+
+    def requests_total(self, view, method, status):
+        body = self.client.get('/metrics').content.decode()
+        labels = {'view': view, 'method': method, 'status': str(status)}
+        for family in text_string_to_metric_families(body):
+            for sample in family.samples:
+                if sample.name == 'justbookit_requests_total' and sample.labels == labels:
+                    return sample.value
+        return 0
+
+    def test_unknown_methods_share_one_label(self):
+        before = self.requests_total('<unresolved>', 'other', 404), self.requests_total('<unresolved>', 'X0RANDOM', 404)
+        self.client.generic('X0RANDOM', '/nope/')
+        after = self.requests_total('<unresolved>', 'other', 404), self.requests_total('<unresolved>', 'X0RANDOM', 404)
+        self.assertEqual(after, (before[0] + 1, before[1]))
+
+    def test_shed_requests_are_labelled_with_their_view(self):
+        shedder = LoadSheddingMiddleware(lambda request: HttpResponse())
+        shedder.limiters['read'] = RouteLimiter('read', concurrency=0, queue=0, timeout=1)
+        before = self.requests_total('booking:search_services', 'GET', 503)
+        response = MetricsMiddleware(shedder)(RequestFactory().get('/search/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.requests_total('booking:search_services', 'GET', 503), before + 1)
+
+
+class MetricsAccessTests(TestCase):
+
+    def test_allowed_from_localhost(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+
+    def test_forbidden_from_other_addresses(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        wrong = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5', HTTP_AUTHORIZATION='Bearer nope')
+        right = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(wrong.status_code, 403)
+        self.assertEqual(right.status_code, 200)
+
+
+class PrefixIndexTests(TestCase):
+
+    def setUp(self):
+        self.provider = User.objects.create_user('provider', password='x', is_professional=True)
+        for name in ['House Cleaning', 'Haircut', 'Plumbing']:
+            Service.objects.create(name=name, description='x', price=10, provider=self.provider)
+        self.index = PrefixIndex()
+
+    def names(self, prefix):
+        return [name for _, name in self.index.lookup(prefix)]
+
+    def test_matches_name_and_word_starts(self):
+        self.assertEqual(self.names('h'), ['Haircut', 'House Cleaning'])
+        self.assertEqual(self.names('clean'), ['House Cleaning'])
+        self.assertEqual(self.names(''), [])
+
+    def test_incremental_updates(self):
+        self.index.build()
+        service = Service.objects.create(name='Window Cleaning', description='x', price=10, provider=self.provider)
+        self.index.service_saved(service.pk, service.name)
+        self.assertEqual(self.names('clean'), ['House Cleaning', 'Window Cleaning'])
+        self.index.service_deleted(service.pk)
+        self.assertEqual(self.names('clean'), ['House Cleaning'])
+
+    def test_write_from_another_worker_forces_rebuild(self):
+        self.index.build()
+        other_worker = PrefixIndex()
+        other_worker.build()
+        service = Service.objects.create(name='Hedge trimming', description='x', price=10, provider=self.provider)
+        other_worker.service_saved(service.pk, service.name)
+        # Our own write now gets version N+2, so we know we missed one.
+        self.index.service_saved(service.pk, service.name)
+        self.assertFalse(self.index._built)
+        self.assertIn('Hedge trimming', self.names('he'))
+
+    def test_only_name_changes_bump_the_version(self):
+        service = Service.objects.get(name='Haircut')
+        version = current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            service.price = 20
+            service.save()
+        self.assertEqual(current_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            service.name = 'Barber'
+            service.save()
+        self.assertEqual(current_version(), version + 1)
+
+    def test_stale_index_keeps_answering_while_another_thread_rebuilds(self):
+        self.index.build()
+        self.index._built = False
+        with self.index._build_lock:
+            self.assertEqual(self.names('plumb'), ['Plumbing'])
+        self.assertFalse(self.index._built)
+        self.names('plumb')
+        self.assertTrue(self.index._built)
+
+    @override_settings(SUGGEST_INDEX_MAX_KEYS=3)
+    def test_key_cap_keeps_full_names_first(self):
+        self.index.build()
+        stats = self.index.stats()
+        self.assertEqual(stats['keys'], 3)
+        self.assertEqual(stats['truncated'], 1)
+        self.assertEqual(self.names('house'), ['House Cleaning'])
+        self.assertEqual(self.names('clean'), [])
@@ -10,10 +10,17 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('service/<int:service_id>/', views.service_detail, name='service_detail'),
+    path('service/<int:service_id>/reviews/', views.service_reviews, name='service_reviews'),
     path('service/<int:service_id>/book/', views.book_service, name='book_service'),
     path('booking/<int:booking_id>/review/', views.review_service, name='review_service'),
     path('search/', views.search_services, name='search_services'),
+    path('search/suggest/', views.suggest_services, name='suggest_services'),
     path('profile/', views.user_profile, name='user_profile'),
+    path('metrics', views.metrics, name='metrics'),
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<slug:profile_id>.<str:extension>', views.profile_file, name='profile_file'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 urlpatterns += [
@@ -1,14 +1,30 @@
+import os
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
-from .models import User, Service, Booking, Review
+from .models import User, Service, Booking, Review, IdempotencyKey
 from .forms import SignUpForm, ServiceForm, BookingForm, ReviewForm, LoginForm, UserProfileForm
 from django.core.mail import send_mail
 from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, FileResponse, Http404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connection, transaction, DatabaseError, IntegrityError
+from django.conf import settings
+from django.utils import timezone
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.crypto import constant_time_compare
+from datetime import datetime, timedelta
+from .suggest import suggest_index
+from .catalog import catalog_page
+from .metrics import EMAILS_SENT, render_metrics
+from . import profiler
 
 
+@catalog_page
 def home(request):
     services = Service.objects.all()
     return render(request, 'booking/home.html', {'services': services, 'title': 'Home'})
@@ -34,31 +50,85 @@ def dashboard(request):
         bookings = Booking.objects.filter(customer=request.user)
     return render(request, 'booking/dashboard.html', {'services': services, 'bookings': bookings, 'title': 'Dashboard'})
 
-@login_required
+REVIEWS_PER_PAGE = 20
+
+
+def encode_review_cursor(review):
+    value = f'{review.created_at.isoformat()}|{review.pk}'
+    return urlsafe_base64_encode(value.encode())
+
+
+def decode_review_cursor(cursor):
+    try:
+        created_at, pk = urlsafe_base64_decode(cursor).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
+
+
+def get_review_page(service, cursor=None):
+    # Keyset pagination on (created_at, id), newest first, so deep pages
+    # cost the same as the first one.
+    reviews = Review.objects.filter(service=service).order_by('-created_at', '-id')
+    position = decode_review_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    page = list(reviews[:REVIEWS_PER_PAGE + 1])
+    next_cursor = None
+    if len(page) > REVIEWS_PER_PAGE:
+        page = page[:REVIEWS_PER_PAGE]
+        next_cursor = encode_review_cursor(page[-1])
+    return page, next_cursor
+
+
 def service_detail(request, service_id):
-    service = Service.objects.get(pk=service_id)
-    reviews = Review.objects.filter(booking__service=service)
-    return render(request, 'booking/service_detail.html', {'service': service, 'reviews': reviews, 'title': service.name})
+    service = get_object_or_404(Service, pk=service_id)
+    reviews, next_cursor = get_review_page(service, request.GET.get('cursor'))
+    return render(request, 'booking/service_detail.html', {
+        'service': service,
+        'reviews': reviews,
+        'next_cursor': next_cursor,
+        'histogram': service.rating_histogram(),
+        'title': service.name,
+    })
+
+
+def service_reviews(request, service_id):
+    service = get_object_or_404(Service, pk=service_id)
+    reviews, next_cursor = get_review_page(service, request.GET.get('cursor'))
+    return JsonResponse({
+        'reviews': [
+            {'id': review.pk, 'rating': review.rating, 'comment': review.comment, 'created_at': review.created_at}
+            for review in reviews
+        ],
+        'next_cursor': next_cursor,
+    })
 
 
+@catalog_page
 def search_services(request):
     query = request.GET.get('q')
     services = Service.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
     return render(request, 'booking/search_results.html', {'services': services, 'query': query, 'title': 'Search results'})
 
 
+def suggest_services(request):
+    query = request.GET.get('q', '')
+    results = [
+        {'id': service_id, 'name': name, 'url': reverse('booking:service_detail', args=[service_id])}
+        for service_id, name in suggest_index.lookup(query)
+    ]
+    return JsonResponse({'query': query, 'results': results})
+
+
 def send_booking_confirmation_email(booking):
     subject = f'Booking Confirmation for {booking.service.name}'
     message = f'Your booking for {booking.service.name} on {booking.date} has been confirmed.'
     from_email = 'noreply@servicebooking.com'
     recipient_list = [booking.customer.email]
-    send_mail(subject, message, from_email, recipient_list)
-
-def update_service_rating(service):
-    reviews = Review.objects.filter(booking__service=service)
-    if reviews:
-        service.average_rating = sum(review.rating for review in reviews) / len(reviews)
-        service.save()
+    sent = send_mail(subject, message, from_email, recipient_list)
+    EMAILS_SENT.labels('booking_confirmation').inc(sent)
 
 
 @login_required
@@ -90,18 +160,70 @@ def review_service(request, booking_id):
             review = form.save(commit=False)
             review.booking = booking
             review.save()
-            update_service_rating(booking.service)
             return redirect('booking:dashboard')
     else:
         form = ReviewForm()
     return render(request, 'booking/review_service.html', {'form': form, 'booking': booking, 'title': f"Review {service.name}"})
 
 
+def idempotency_cutoff():
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+
+def find_idempotent_booking(user, key):
+    # Expired keys are ignored here and deleted by purge_idempotency_keys.
+    return (
+        IdempotencyKey.objects.filter(user=user, key=key, created_at__gte=idempotency_cutoff())
+        .values_list('booking_id', 'booking__service_id')
+        .first()
+    )
+
+
+def save_booking_with_key(booking, user, key):
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                booking.save()
+                if key:
+                    IdempotencyKey.objects.create(user=user, key=key, booking=booking)
+            return
+        except IntegrityError:
+            if attempt or not key or find_idempotent_booking(user, key):
+                raise
+            # Only an expired key that hasn't been purged yet is in the way.
+            IdempotencyKey.objects.filter(user=user, key=key, created_at__lt=idempotency_cutoff()).delete()
+            booking.pk = None
+            booking._state.adding = True
+
+
+def replayed_booking_response(existing, service):
+    _, service_id = existing
+    if service_id != service.pk:
+        return HttpResponse(
+            "This idempotency key was already used to book a different service.",
+            status=422, content_type='text/plain',
+        )
+    response = redirect('booking:dashboard')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
 @login_required
 def book_service(request, service_id):
     service = get_object_or_404(Service, pk=service_id)
 
     if request.method == 'POST':
+        # Browsers send the key issued with the form, API clients an
+        # Idempotency-Key header. A key that already produced a booking
+        # short-circuits validation, the insert and the email.
+        key = request.POST.get('idempotency_key') or request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if key:
+            if len(key) > 64:
+                return HttpResponseBadRequest("Idempotency key is too long.")
+            existing = find_idempotent_booking(request.user, key)
+            if existing:
+                return replayed_booking_response(existing, service)
+
         form = BookingForm(request.POST)
         if form.is_valid():
             booking = form.save(commit=False)
@@ -112,7 +234,12 @@ def book_service(request, service_id):
             if booking.customer == booking.service.provider:
                 form.add_error(None, "You cannot book your own service.")
             else:
-                booking.save()
+                try:
+                    save_booking_with_key(booking, request.user, key)
+                except IntegrityError:
+                    # A concurrent submission with the same key won the race;
+                    # our booking was rolled back with the key insert.
+                    return replayed_booking_response(find_idempotent_booking(request.user, key), service)
                 send_booking_confirmation_email(booking)
                 return redirect('booking:dashboard')
     else:
@@ -152,3 +279,67 @@ def sign_in(request):
             else:
                 return render(request, "booking/login.html", context)
                 messages.error(request, "Please check your login information and try again")
+
+
+def metrics_access_allowed(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+
+
+def metrics(request):
+    if not metrics_access_allowed(request):
+        return HttpResponseForbidden()
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+def database_is_up():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except DatabaseError:
+        return False
+
+
+# Once every migration is applied a worker stays ready, so the migration
+# plan is only computed until the first successful check.
+migrations_applied = False
+
+
+def healthz(request):
+    if not database_is_up():
+        return JsonResponse({'status': 'error', 'database': False}, status=503)
+    return JsonResponse({'status': 'ok', 'database': True})
+
+
+def readyz(request):
+    global migrations_applied
+    if not database_is_up():
+        return JsonResponse({'status': 'error', 'database': False}, status=503)
+    if not migrations_applied:
+        executor = MigrationExecutor(connection)
+        migrations_applied = not executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if not migrations_applied:
+        return JsonResponse({'status': 'error', 'database': True, 'migrations': False}, status=503)
+    return JsonResponse({'status': 'ok', 'database': True, 'migrations': True})
+
+
+@staff_member_required
+def profiles(request):
+    return render(request, 'booking/profiles.html', {
+        'profiles': profiler.recent_profiles(),
+        'token': profiler.make_token(request.user),
+        'title': 'Profiles',
+    })
+
+
+@staff_member_required
+def profile_file(request, profile_id, extension):
+    path = profiler.profile_path(profile_id, extension)
+    if extension not in ('prof', 'collapsed', 'json') or not os.path.exists(path):
+        raise Http404("No such profile.")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
@@ -0,0 +1,44 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Shared by all workers; must match the default in settings.py.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'justbookit_metrics'))
+
+
+def on_starting(server):
+    # Drop metric files left behind by a previous run.
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def when_ready(server):
+    # The catalog snapshot lives on this host's disk, so every host runs its
+    # own rebuild loop; the first build already ran from the Procfile.
+    interval = os.environ.get('CATALOG_SNAPSHOT_INTERVAL', '30')
+    if float(interval) > 0:
+        manage = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manage.py')
+        server.snapshot_builder = subprocess.Popen(
+            [sys.executable, manage, 'build_catalog_snapshot', '--watch', interval],
+        )
+
+
+def on_exit(server):
+    builder = getattr(server, 'snapshot_builder', None)
+    if builder is not None:
+        builder.terminate()
+        builder.wait()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# Threads let one worker keep serving reads while writes wait on the
+# database or SMTP; LoadSheddingMiddleware caps how many threads each
+# route class may occupy (settings.WORKER_THREADS reads the same variable).
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,11 +63,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, plus pre-rendered catalog pages for anonymous visitors.
+    'booking.snapshot.CatalogSnapshotMiddleware',
+    'booking.middleware.MetricsMiddleware',
+    'booking.loadshedding.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'booking.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,7 +82,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -85,6 +89,14 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Always cache compiled templates, whatever DJANGO_DEBUG says.
+            # runserver still picks up template edits through its autoreloader.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -108,6 +120,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # gunicorn runs threaded workers: take the write lock up front and
+        # wait for it instead of failing with "database is locked".
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file rather than the shared in-memory database, so concurrent
+        # tests get the same locking behaviour as the real database.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -121,6 +144,92 @@ if 'DATABASE_URL' in os.environ:
         conn_health_checks=True,
     )
 
+# Use a psycopg 3 connection pool shared by the threads of each worker
+# instead of one persistent connection per thread. PostgreSQL only.
+# Total connections are bounded by workers * DATABASE_POOL_MAX_SIZE.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '') == 'True'
+
+if DATABASE_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # Persistent connections can't be combined with a pool.
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = False
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 4)),
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 600)),
+        'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+    }
+
+
+# Cache shared by all gunicorn workers on the host.
+CACHES = {
+    'default': {
+        'BACKEND': 'booking.cache.InstrumentedFileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'justbookit_cache')),
+    }
+}
+
+# Seconds between checks of the shared suggestion index version.
+SUGGEST_VERSION_CHECK_INTERVAL = 2
+# Upper bound on keys in each worker's suggestion index. Whole service
+# names are kept first, then word starts, until the cap is reached.
+SUGGEST_INDEX_MAX_KEYS = 200000
+
+# max-age (seconds) of the public Cache-Control header on anonymous catalog
+# pages. Clients and proxies revalidate with ETag/Last-Modified afterwards.
+CATALOG_CACHE_MAX_AGE = 60
+
+# How long (seconds) a host may serve the cached catalog version before
+# re-reading it from the database. Bounds how stale 304s can be on hosts
+# other than the one that handled the write.
+CATALOG_VERSION_TTL = 5
+
+# Prometheus multiprocess mode: each worker writes its metrics here and
+# /metrics aggregates them. Must be set before prometheus_client is imported.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'justbookit_metrics')
+)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+# /metrics is only served to these client addresses, or to requests with
+# "Authorization: Bearer <METRICS_TOKEN>" when a token is set.
+METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Where the staff request profiler writes its output, and how many
+# profiles to keep.
+PROFILER_DIR = os.environ.get('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'justbookit_profiles'))
+PROFILER_KEEP = 50
+
+# Threads per gunicorn worker; read by gunicorn.conf.py from the same
+# environment variable.
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Per-process load shedding, see booking/loadshedding.py. Requests not
+# matched by a route class fall into "read". Limits are per worker process
+# and derived from WORKER_THREADS. Reads may use all threads but one, with a
+# queue for overflow; writes get a small share and are shed first, so a burst
+# of slow writes can't starve reads.
+LOAD_SHEDDING = {
+    'write': {
+        'views': ['booking:book_service', 'booking:review_service'],
+        'methods': ['POST'],
+        'concurrency': max(1, WORKER_THREADS // 4),
+        'queue': max(1, WORKER_THREADS // 4),
+        'timeout': 1.0,
+        'retry_after': 5,
+    },
+    'read': {
+        'concurrency': max(1, WORKER_THREADS - 1),
+        'queue': WORKER_THREADS,
+        'timeout': 2.0,
+        'retry_after': 1,
+    },
+}
+LOAD_SHEDDING_EXEMPT_VIEWS = ['booking:metrics', 'booking:healthz', 'booking:readyz']
+
+# How long (seconds) a booking idempotency key is remembered.
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
 
 
 # Password validation
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'service_booking_system.settings')
 
 application = get_wsgi_application()
+
+# Build the search suggestion index and compile the templates before the
+# worker takes traffic.
+from booking.suggest import suggest_index
+from booking.templatecache import precompile_templates
+suggest_index.warm_up()
+precompile_templates()